@@ -1,6 +1,16 @@
+import hashlib
+import hmac
+import html
 import io
+import json
+import os
 import re
+import secrets
+import tempfile
+import threading
 import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pandas as pd
@@ -48,6 +58,8 @@ html, body, [class*="css"] { font-family: -apple-system, BlinkMacSystemFont, "Se
 .small-btn > button { padding: 8px 10px !important; font-size: 14px !important; border-radius: 12px !important; }
 hr { border: none; border-top: 1px solid rgba(0,0,0,0.08); margin: 10px 0; }
 .muted { color: rgba(0,0,0,0.55); font-size: 12px; }
+.ficha-text { white-space: pre-wrap; font-family: "Source Code Pro", monospace; font-size: 14px; margin-bottom: 12px; }
+.ficha-empty { background: rgba(28,131,225,0.1); border-radius: 8px; padding: 12px 16px; }
 </style>
 """,
     unsafe_allow_html=True,
@@ -159,16 +171,85 @@ def get_creds():
     )
 
 
+LOAD_POOL_PREFIX = "yvora-load"
+LOAD_POOL_WORKERS = 4
+WARMUP_THREAD_NAME = "yvora-warmup"
+
+
 @st.cache_resource
-def sheets_service():
+def load_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=LOAD_POOL_WORKERS, thread_name_prefix=LOAD_POOL_PREFIX)
+
+
+@st.cache_resource
+def _thread_clients() -> threading.local:
+    return threading.local()
+
+
+def _thread_client(api: str, version: str, shared):
+    """
+    httplib2 não é thread-safe: as threads do pool de carga e a do warm-up usam
+    clientes próprios; as sessões dividem o cliente compartilhado.
+    """
+    if not threading.current_thread().name.startswith((LOAD_POOL_PREFIX, WARMUP_THREAD_NAME)):
+        return shared()
+    local = _thread_clients()
+    if not hasattr(local, api):
+        setattr(local, api, build(api, version, credentials=get_creds()))
+    return getattr(local, api)
+
+
+@st.cache_resource
+def _shared_sheets_service():
     return build("sheets", "v4", credentials=get_creds())
 
 
 @st.cache_resource
-def drive_service():
+def _shared_drive_service():
     return build("drive", "v3", credentials=get_creds())
 
 
+def sheets_service():
+    return _thread_client("sheets", "v4", _shared_sheets_service)
+
+
+def drive_service():
+    return _thread_client("drive", "v3", _shared_drive_service)
+
+
+# ======================================================
+# UNIDADES (uma planilha por restaurante)
+# ======================================================
+def configured_locations() -> dict[str, dict]:
+    """
+    [locations.<chave>] com name e sheet_id nos secrets.
+    Sem essa seção, SHEET_ID vira a única unidade ("default").
+    """
+    locs = st.secrets.get("locations", {})
+    if locs:
+        return {
+            str(k): {"name": str(v.get("name", k)), "sheet_id": str(v["sheet_id"])}
+            for k, v in locs.items()
+        }
+    return {"default": {"name": "Yvora", "sheet_id": st.secrets["SHEET_ID"]}}
+
+
+def users_sheet_id() -> str:
+    """A aba users fica em USERS_SHEET_ID, SHEET_ID ou na primeira unidade."""
+    ssid = st.secrets.get("USERS_SHEET_ID", "") or st.secrets.get("SHEET_ID", "")
+    return ssid or next(iter(configured_locations().values()))["sheet_id"]
+
+
+def user_locations(auth: dict) -> list[str]:
+    """Coluna opcional locations na aba users (chaves separadas por vírgula); vazia ou * = todas."""
+    all_locs = list(configured_locations().keys())
+    raw = str(auth.get("locations", "")).strip()
+    if auth.get("role") == "admin" or raw in ["", "*"]:
+        return all_locs
+    wanted = [x.strip() for x in raw.split(",")]
+    return [k for k in all_locs if k in wanted]
+
+
 def _get_sheet_id_by_title(spreadsheet_id: str, title: str) -> int | None:
     meta = sheets_service().spreadsheets().get(
         spreadsheetId=spreadsheet_id,
@@ -183,9 +264,8 @@ def _get_sheet_id_by_title(spreadsheet_id: str, title: str) -> int | None:
 
 
 @st.cache_data(ttl=30)
-def read_sheet_values(tab: str) -> pd.DataFrame:
+def read_sheet_values(ssid: str, tab: str) -> pd.DataFrame:
     """Leitura simples: pega valores (sem hyperlinks de smart chips)."""
-    ssid = st.secrets["SHEET_ID"]
     result = sheets_service().spreadsheets().values().get(
         spreadsheetId=ssid,
         range=tab,
@@ -198,16 +278,22 @@ def read_sheet_values(tab: str) -> pd.DataFrame:
     return pd.DataFrame(values[1:], columns=cols)
 
 
+def _cell_text(cell: dict) -> str:
+    """Hyperlink (smart chip) se houver; senão o valor formatado."""
+    fv = str(cell.get("formattedValue", "") or "").strip()
+    hl = str(cell.get("hyperlink", "") or "").strip()
+    return hl if hl else fv
+
+
 @st.cache_data(ttl=30)
-def read_sheet_with_hyperlinks(tab: str) -> pd.DataFrame:
+def read_sheet_with_hyperlinks(ssid: str, tab: str) -> pd.DataFrame:
     """
     Leitura robusta: captura hyperlinks (inclui Drive smart chips).
     Usa spreadsheets.get(includeGridData) e extrai cell.hyperlink.
     """
-    ssid = st.secrets["SHEET_ID"]
     sid = _get_sheet_id_by_title(ssid, tab)
     if sid is None:
-        return read_sheet_values(tab)
+        return read_sheet_values(ssid, tab)
 
     resp = sheets_service().spreadsheets().get(
         spreadsheetId=ssid,
@@ -238,11 +324,7 @@ def read_sheet_with_hyperlinks(tab: str) -> pd.DataFrame:
     rows: list[list[str]] = []
     for r in rowData[1:]:
         vals = r.get("values", [])
-        out_row: list[str] = []
-        for cell in vals:
-            fv = str(cell.get("formattedValue", "") or "").strip()
-            hl = str(cell.get("hyperlink", "") or "").strip()
-            out_row.append(hl if hl else fv)
+        out_row = [_cell_text(cell) for cell in vals]
 
         if len(out_row) < len(headers):
             out_row += [""] * (len(headers) - len(out_row))
@@ -251,26 +333,153 @@ def read_sheet_with_hyperlinks(tab: str) -> pd.DataFrame:
     return pd.DataFrame(rows, columns=headers)
 
 
-def write_sheet(tab: str, df: pd.DataFrame):
-    """Escreve em RAW (texto). Hyperlinks viram texto do link."""
-    ssid = st.secrets["SHEET_ID"]
-    values = [df.columns.tolist()] + df.fillna("").astype(str).values.tolist()
-    sheets_service().spreadsheets().values().update(
+@st.cache_data(ttl=30)
+def read_sheet_header(ssid: str, tab: str) -> list[str]:
+    result = sheets_service().spreadsheets().values().get(
+        spreadsheetId=ssid,
+        range=f"{tab}!1:1",
+    ).execute()
+
+    values = result.get("values", [])
+    headers = [str(h).strip() for h in values[0]] if values else []
+    return [h if h else f"col_{i+1}" for i, h in enumerate(headers)]
+
+
+@st.cache_data(ttl=30)
+def read_sheet_columns(ssid: str, tab: str, cols: tuple[str, ...]) -> pd.DataFrame:
+    """
+    Leitura projetada: só as colunas pedidas (com hyperlinks), numa única chamada.
+    Inclui _row com o número da linha na planilha, para buscar a linha inteira depois.
+    """
+    headers = read_sheet_header(ssid, tab)
+    present = [c for c in cols if c in headers]
+    if not present:
+        return pd.DataFrame(columns=list(cols) + ["_row"])
+
+    resp = sheets_service().spreadsheets().get(
         spreadsheetId=ssid,
-        range=f"{tab}!A1",
-        valueInputOption="RAW",
-        body={"values": values},
+        ranges=[f"{tab}!{col_letter(headers.index(c))}2:{col_letter(headers.index(c))}" for c in present],
+        includeGridData=True,
+        fields="sheets(data(rowData(values(formattedValue,hyperlink))))",
     ).execute()
 
+    sheets = resp.get("sheets", [])
+    data = sheets[0].get("data", []) if sheets else []
+
+    columns: dict[str, list[str]] = {}
+    for c, grid in zip(present, data):
+        columns[c] = [
+            _cell_text((r.get("values") or [{}])[0])
+            for r in grid.get("rowData", [])
+        ]
+
+    n = max((len(v) for v in columns.values()), default=0)
+    out = pd.DataFrame({
+        c: (columns.get(c, []) + [""] * n)[:n] for c in cols
+    })
+    out["_row"] = range(2, n + 2)
+    return out
+
+
+@st.cache_data(ttl=30)
+def read_sheet_row(ssid: str, tab: str, row: int) -> dict[str, str]:
+    """Uma linha inteira (com hyperlinks), pelo número da linha na planilha."""
+    headers = read_sheet_header(ssid, tab)
+    if not headers:
+        return {}
+
+    resp = sheets_service().spreadsheets().get(
+        spreadsheetId=ssid,
+        ranges=[f"{tab}!A{row}:{col_letter(len(headers) - 1)}{row}"],
+        includeGridData=True,
+        fields="sheets(data(rowData(values(formattedValue,hyperlink))))",
+    ).execute()
+
+    sheets = resp.get("sheets", [])
+    data = sheets[0].get("data", []) if sheets else []
+    rowData = data[0].get("rowData", []) if data else []
+    vals = [_cell_text(cell) for cell in rowData[0].get("values", [])] if rowData else []
+    vals += [""] * (len(headers) - len(vals))
+    return dict(zip(headers, vals))
+
+
+def clear_sheet_caches():
     read_sheet_values.clear()
     read_sheet_with_hyperlinks.clear()
+    read_sheet_header.clear()
+    read_sheet_columns.clear()
+    read_sheet_row.clear()
+
+
+def col_letter(idx: int) -> str:
+    """Índice de coluna (0 = A) para a letra A1."""
+    out = ""
+    n = idx + 1
+    while n:
+        n, r = divmod(n - 1, 26)
+        out = chr(65 + r) + out
+    return out
+
+
+def batch_write_ranges(ssid: str, tab: str, data: list[tuple[str, list[list[str]]]]):
+    """Escreve várias faixas A1 (RAW) numa única chamada values.batchUpdate."""
+    if not data:
+        return
+    sheets_service().spreadsheets().values().batchUpdate(
+        spreadsheetId=ssid,
+        body={
+            "valueInputOption": "RAW",
+            "data": [{"range": f"{tab}!{rng}", "values": vals} for rng, vals in data],
+        },
+    ).execute()
+
+    clear_sheet_caches()
+
+
+def write_row_cells(ssid: str, tab: str, updates: dict[int, dict[str, str]]):
+    """
+    Grava só as células alteradas ({linha: {coluna: valor}}) numa única chamada.
+    Colunas que ainda não existem são criadas no fim do cabeçalho.
+    """
+    headers = read_sheet_header(ssid, tab)
+    new_cols: list[str] = []
+    for changes in updates.values():
+        for c in changes:
+            if c not in headers and c not in new_cols:
+                new_cols.append(c)
+    col_idx = {c: i for i, c in enumerate(headers + new_cols)}
+
+    data: list[tuple[str, list[list[str]]]] = []
+    if new_cols:
+        data.append((f"{col_letter(len(headers))}1", [new_cols]))
+    for row, changes in updates.items():
+        for c, v in changes.items():
+            data.append((f"{col_letter(col_idx[c])}{row}", [[str(v)]]))
+
+    batch_write_ranges(ssid, tab, data)
+
+
+def delete_sheet_row(ssid: str, tab: str, row: int):
+    sid = _get_sheet_id_by_title(ssid, tab)
+    if sid is None:
+        raise ValueError(f"Aba {tab} não encontrada.")
+
+    sheets_service().spreadsheets().batchUpdate(
+        spreadsheetId=ssid,
+        body={"requests": [{
+            "deleteDimension": {
+                "range": {"sheetId": sid, "dimension": "ROWS", "startIndex": row - 1, "endIndex": row},
+            },
+        }]},
+    ).execute()
+
+    clear_sheet_caches()
 
 
 # ======================================================
 # DRIVE MEDIA (bytes)
 # ======================================================
-@st.cache_data(ttl=300)
-def drive_download_bytes(file_id: str) -> bytes:
+def download_drive_file(file_id: str) -> bytes:
     req = drive_service().files().get_media(fileId=file_id)
     fh = io.BytesIO()
     downloader = MediaIoBaseDownload(fh, req)
@@ -280,18 +489,250 @@ def drive_download_bytes(file_id: str) -> bytes:
     return fh.getvalue()
 
 
+@st.cache_data(ttl=300)
+def drive_download_bytes(file_id: str) -> bytes:
+    return download_drive_file(file_id)
+
+
+# ======================================================
+# DRIVE MEDIA (arquivos estáticos)
+# ======================================================
+# Servido pelo static serving do Streamlit (.streamlit/config.toml).
+# Limites do Streamlit: 200 MB por arquivo e 1 GB na pasta static (checado no start).
+MEDIA_STATIC_DIR = Path(__file__).parent / "static" / "media"
+MEDIA_STATIC_URL = "app/static/media"
+MEDIA_STATIC_MAX_FILE = 200 * 1024 * 1024
+MEDIA_STATIC_MAX_DIR = 800 * 1024 * 1024
+
+
+def guess_media_ext(data: bytes) -> str | None:
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[4:8] == b"ftyp":
+        return "mov" if data[8:10] == b"qt" else "mp4"
+    if data.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm"
+    return None
+
+
+def media_static_url(name: str) -> str:
+    # Nome = hash do conteúdo: a URL só muda quando o arquivo muda,
+    # e o navegador revalida via ETag/Last-Modified (304) nos reruns.
+    return f"{MEDIA_STATIC_URL}/{name}"
+
+
+def prune_media_static_dir():
+    """Remove os arquivos menos usados recentemente até caber em MEDIA_STATIC_MAX_DIR."""
+    files = [p for p in MEDIA_STATIC_DIR.iterdir() if p.is_file() and not p.name.startswith(".")]
+    total = sum(p.stat().st_size for p in files)
+    for p in sorted(files, key=lambda f: f.stat().st_atime):
+        if total <= MEDIA_STATIC_MAX_DIR:
+            break
+        total -= p.stat().st_size
+        p.unlink(missing_ok=True)
+
+
+MIME_MEDIA_EXT = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "video/mp4": "mp4",
+    "video/quicktime": "mov",
+    "video/webm": "webm",
+}
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def drive_media_static_name(file_id: str, md5: str, mime: str) -> str | None:
+    """
+    Baixa a mídia do Drive para static/media (nome = md5 do conteúdo) e devolve o nome.
+    Só o nome fica em cache; o arquivo sai do disco e o navegador o guarda entre reruns.
+    Com o md5 dos metadados, um arquivo já presente no disco não é baixado de novo.
+    Retorna None, sem baixar nada, se o mimeType não for servido como arquivo estático
+    (o chamador baixa os bytes uma única vez pelo caminho antigo).
+    """
+    ext = MIME_MEDIA_EXT.get(mime)
+    if not ext:
+        return None
+    if md5:
+        path = MEDIA_STATIC_DIR / f"{md5}.{ext}"
+        if path.exists():
+            path.touch()
+            return media_static_url(path.name)
+
+    data = download_drive_file(file_id)
+    ext = guess_media_ext(data) or ext
+    if len(data) > MEDIA_STATIC_MAX_FILE:
+        return None
+
+    digest = hashlib.md5(data).hexdigest()
+    name = f"{digest}.{ext}"
+    path = MEDIA_STATIC_DIR / name
+    if not path.exists():
+        MEDIA_STATIC_DIR.mkdir(parents=True, exist_ok=True)
+        # nome temporário único: o warm-up e as sessões rodam no mesmo processo;
+        # o "." inicial deixa o arquivo fora do prune_media_static_dir
+        with tempfile.NamedTemporaryFile(dir=MEDIA_STATIC_DIR, prefix=".", suffix=".tmp", delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+        prune_media_static_dir()
+    return name
+
+
+def drive_media_static_url(file_id: str, meta: dict) -> str | None:
+    """URL estática da mídia; se o prune apagou o arquivo de um nome em cache, baixa de novo."""
+    args = (file_id, meta.get("md5Checksum", ""), meta.get("mimeType", ""))
+    name = drive_media_static_name(*args)
+    if name and not (MEDIA_STATIC_DIR / name).exists():
+        drive_media_static_name.clear(*args)
+        name = drive_media_static_name(*args)
+    return media_static_url(name) if name else None
+
+
+# ======================================================
+# DRIVE MEDIA (metadados em lote)
+# ======================================================
+MEDIA_URL_COLS = ["cover_photo_url", "training_video_url"]
+DRIVE_META_FIELDS = "id,name,size,mimeType,md5Checksum,modifiedTime"
+DRIVE_BATCH_SIZE = 100
+DRIVE_BATCH_RETRIES = 2
+DRIVE_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "dailyLimitExceeded"}
+
+
+def collect_media_file_ids(items: pd.DataFrame) -> tuple[str, ...]:
+    ids: set[str] = set()
+    for c in MEDIA_URL_COLS:
+        if c in items.columns:
+            for raw in items[c].fillna("").astype(str):
+                fid = extract_drive_file_id(raw)
+                if fid:
+                    ids.add(fid)
+    return tuple(sorted(ids))
+
+
+def drive_error_is_permanent(exception) -> bool:
+    """Só 404 e permissão negada indicam link quebrado; 429/5xx/limite de taxa são transitórios."""
+    status = getattr(getattr(exception, "resp", None), "status", None)
+    if status == 404:
+        return True
+    if status != 403:
+        return False
+    details = getattr(exception, "error_details", None)
+    reasons = {d.get("reason", "") for d in details if isinstance(d, dict)} if isinstance(details, list) else set()
+    return not reasons & DRIVE_RATE_LIMIT_REASONS
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def drive_media_metadata(file_ids: tuple[str, ...], _retries: int = 0) -> dict[str, dict]:
+    """
+    Metadados (size, mimeType, md5Checksum, modifiedTime) de todas as mídias do catálogo,
+    em batch HTTP do Drive (até 100 arquivos por requisição).
+    404/permissão negada viram {"error": status}; os arquivos com falha transitória ficam
+    fora do resultado (tratados como sem metadados). Só o warm-up passa _retries > 0:
+    o backoff não entra na renderização da lista (e _retries não faz parte da chave do cache).
+    """
+    out: dict[str, dict] = {}
+    transient: list[str] = []
+
+    def _collect(request_id, response, exception):
+        if exception is None:
+            out[request_id] = response
+        elif drive_error_is_permanent(exception):
+            out[request_id] = {"error": str(exception.resp.status)}
+        else:
+            transient.append(request_id)
+
+    svc = drive_service()
+    pending = list(file_ids)
+    for attempt in range(_retries + 1):
+        if attempt:
+            time.sleep(2 ** attempt)
+        transient.clear()
+        for start in range(0, len(pending), DRIVE_BATCH_SIZE):
+            batch = svc.new_batch_http_request(callback=_collect)
+            for fid in pending[start:start + DRIVE_BATCH_SIZE]:
+                batch.add(
+                    svc.files().get(fileId=fid, fields=DRIVE_META_FIELDS, supportsAllDrives=True),
+                    request_id=fid,
+                )
+            batch.execute()
+        if not transient:
+            break
+        pending = list(transient)
+    return out
+
+
+def drive_media_downloadable(meta: dict) -> bool:
+    """
+    False para link quebrado, arquivo grande demais ou sem metadados (tamanho desconhecido):
+    nesses casos usa o link/player do Drive.
+    """
+    if not meta or meta.get("error"):
+        return False
+    return int(meta.get("size", 0) or 0) <= MEDIA_STATIC_MAX_FILE
+
+
+def drive_file_metadata(file_id: str, media_meta: dict[str, dict]) -> dict:
+    """Metadados do lote do catálogo; se o arquivo ficou fora dele, busca só esse arquivo."""
+    if file_id in media_meta:
+        return media_meta[file_id]
+    try:
+        return drive_media_metadata((file_id,)).get(file_id, {})
+    except Exception:
+        return {}
+
+
+def render_static_image(url: str):
+    st.markdown(
+        f"<img src='{url}' style='width:100%; display:block;' alt=''/>",
+        unsafe_allow_html=True,
+    )
+
+
+def render_static_video(url: str):
+    st.markdown(
+        f"<video src='{url}' controls playsinline preload='metadata' style='width:100%; display:block;'></video>",
+        unsafe_allow_html=True,
+    )
+
+
 # ======================================================
 # AUTH
 # ======================================================
 ROLE_LABEL = {"viewer": "Cozinha", "editor": "Chefe", "admin": "Administrador"}
 REQUIRED_USER_COLS = ["username", "password", "role", "active", "can_drinks", "can_pratos"]
+AUTH_REVALIDATE_SECONDS = 600
 
 
 def logout():
-    for k in ["auth", "item", "login_user", "login_pass", "confirm_delete", "creating_new"]:
+    for k in [
+        "auth", "item", "login_user", "login_pass", "confirm_delete", "creating_new",
+        "location", "search_all_locations", "grid_mode",
+    ]:
+        st.session_state.pop(k, None)
+
+
+def reset_item_selection():
+    for k in ["item", "confirm_delete", "creating_new"]:
         st.session_state.pop(k, None)
 
 
+def open_item(location: str, item_id: str):
+    # callback: "location" é chave de widget e só pode mudar antes de ele ser criado
+    record_view(location, item_id)
+    st.session_state["location"] = location
+    st.session_state["item"] = item_id
+    st.session_state.pop("creating_new", None)
+    st.session_state.pop("confirm_delete", None)
+
+
 def is_admin() -> bool:
     return st.session_state.get("auth", {}).get("role") == "admin"
 
@@ -317,9 +758,68 @@ def validate_users_df(users: pd.DataFrame):
         raise ValueError(f"Faltam colunas na aba users: {', '.join(missing)}")
 
 
-def login(users: pd.DataFrame):
+@st.cache_resource
+def password_hash_key() -> bytes:
+    """SESSION_SECRET nos secrets; sem ele, chave aleatória por processo."""
+    secret = st.secrets.get("SESSION_SECRET", "")
+    return secret.encode() if secret else secrets.token_bytes(32)
+
+
+def hash_password(password: str) -> str:
+    return hmac.new(password_hash_key(), password.encode(), hashlib.sha256).hexdigest()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_users_index(users_tab: str) -> dict[str, dict]:
+    """Usuários ativos por username, com a senha já em hash (sem texto puro em cache)."""
+    users = read_sheet_values(users_sheet_id(), users_tab)
     validate_users_df(users)
 
+    index: dict[str, dict] = {}
+    for row in users.fillna("").astype(str).to_dict("records"):
+        if row["active"] != "1" or row["username"] in index:
+            continue
+        index[row["username"]] = {
+            "username": row["username"],
+            "password_hash": hash_password(row["password"]),
+            "role": row["role"],
+            "can_drinks": row["can_drinks"],
+            "can_pratos": row["can_pratos"],
+            "locations": row.get("locations", ""),
+        }
+    return index
+
+
+def start_session(user: dict):
+    auth = {k: user[k] for k in ["username", "role", "can_drinks", "can_pratos", "locations"]}
+    auth["pwh"] = user["password_hash"][:16]
+    auth["validated_at"] = time.time()
+    st.session_state["auth"] = auth
+
+
+def check_session(users_tab: str) -> bool:
+    """
+    O session_state fica no servidor, então basta revalidar contra a aba users a cada
+    AUTH_REVALIDATE_SECONDS (usuário desativado, permissões ou senha alteradas).
+    """
+    auth = st.session_state["auth"]
+    if time.time() - auth.get("validated_at", 0) < AUTH_REVALIDATE_SECONDS:
+        return True
+
+    try:
+        users_index = load_users_index(users_tab)
+    except Exception:
+        # planilha indisponível: mantém a sessão e tenta de novo no próximo rerun
+        return True
+
+    user = users_index.get(auth["username"])
+    if user is None or user["password_hash"][:16] != auth.get("pwh"):
+        return False
+    start_session(user)
+    return True
+
+
+def login(users_index: dict[str, dict]):
     st.markdown("<div class='card'>", unsafe_allow_html=True)
     st.subheader("Login")
 
@@ -329,25 +829,11 @@ def login(users: pd.DataFrame):
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Entrar", type="primary", use_container_width=True):
-            df = users.copy()
-            for c in ["active", "can_drinks", "can_pratos"]:
-                df[c] = df[c].astype(str)
-
-            match = df[
-                (df["username"].astype(str) == str(u)) &
-                (df["password"].astype(str) == str(p)) &
-                (df["active"] == "1")
-            ]
-            if match.empty:
+            user = users_index.get(str(u))
+            if user is None or not hmac.compare_digest(user["password_hash"], hash_password(str(p))):
                 st.error("Usuário ou senha inválidos (ou usuário inativo).")
             else:
-                row = match.iloc[0]
-                st.session_state["auth"] = {
-                    "username": str(row["username"]),
-                    "role": str(row["role"]),
-                    "can_drinks": str(row["can_drinks"]),
-                    "can_pratos": str(row["can_pratos"]),
-                }
+                start_session(user)
                 st.session_state.pop("item", None)
                 st.session_state.pop("creating_new", None)
                 st.rerun()
@@ -424,48 +910,128 @@ def ensure_item_min_schema(items: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-def next_id(items: pd.DataFrame, prefix: str) -> str:
-    if items.empty or "id" not in items.columns:
-        return f"{prefix}001"
-    ids = items["id"].astype(str).tolist()
-    nums: list[int] = []
-    for x in ids:
-        if x.startswith(prefix):
-            tail = x.replace(prefix, "")
-            if tail.isdigit():
-                nums.append(int(tail))
-    n = max(nums) + 1 if nums else 1
-    return f"{prefix}{str(n).zfill(3)}"
+LIST_INDEX_COLS = ["id", "type", "name", "tags", "category", "cover_photo_url", "training_video_url"]
+
+
+def load_item_index(ssid: str, tab: str) -> pd.DataFrame:
+    """Lista leve para a tela de itens; o resto da linha só é buscado ao abrir o item."""
+    return read_sheet_columns(ssid, tab, tuple(LIST_INDEX_COLS))
+
+
+def load_item_cols(ssid: str, tab: str) -> list[str]:
+    headers = read_sheet_header(ssid, tab)
+    return headers + [c for c in BASE_ITEM_COLS if c not in headers]
+
+
+def next_free_row(index: pd.DataFrame) -> int:
+    return int(index["_row"].max()) + 1 if not index.empty else 2
 
 
-def upsert_item(items: pd.DataFrame, item: dict) -> pd.DataFrame:
-    out = ensure_item_min_schema(items.copy())
-    item_id = str(item.get("id", "")).strip()
+def load_location_indexes(tab: str, keys: list[str]) -> tuple[dict[str, pd.DataFrame], dict[str, str]]:
+    """
+    Índices das unidades em paralelo (pool de threads); cada planilha tem o próprio cache.
+    Retorna (índices, erros) por chave de unidade.
+    """
+    locs = configured_locations()
+    if len(keys) == 1:
+        futures = {}
+    else:
+        futures = {k: load_pool().submit(load_item_index, locs[k]["sheet_id"], tab) for k in keys}
+
+    indexes: dict[str, pd.DataFrame] = {}
+    errors: dict[str, str] = {}
+    for k in keys:
+        try:
+            indexes[k] = futures[k].result() if futures else load_item_index(locs[k]["sheet_id"], tab)
+        except Exception as e:
+            errors[k] = str(e)
+    return indexes, errors
+
+
+def search_index(df: pd.DataFrame, busca: str) -> pd.DataFrame:
+    if not busca or df.empty:
+        return df
+    b = busca.strip().lower()
+    name_ok = df["name"].astype(str).str.lower().str.contains(b) if "name" in df.columns else False
+    tags_ok = df["tags"].astype(str).str.lower().str.contains(b) if "tags" in df.columns else False
+    return df[name_ok | tags_ok]
+
+
+def read_item(ssid: str, tab: str, index: pd.DataFrame, item_id: str) -> tuple[dict, int] | None:
+    """Linha completa do item (cacheada por linha). Retorna (item, número da linha)."""
+    for attempt in range(2):
+        match = index[index["id"].astype(str) == item_id]
+        if match.empty:
+            return None
+        row = int(match.iloc[0]["_row"])
+        item = read_sheet_row(ssid, tab, row)
+        if str(item.get("id", "")) == item_id:
+            return item, row
+        # planilha mudou (linhas inseridas/removidas) desde o índice: recarrega
+        clear_sheet_caches()
+        index = load_item_index(ssid, tab)
+    return None
+
+
+def check_item_row(ssid: str, tab: str, row: int, item_id: str):
+    """
+    Relê a linha sem cache antes de gravar/excluir: se linhas foram inseridas ou removidas
+    (na planilha ou por outra réplica), o número em cache apontaria para outro item.
+    """
+    clear_sheet_caches()
+    if str(read_sheet_row(ssid, tab, row).get("id", "")) != item_id:
+        raise ValueError("A planilha mudou desde que o item foi aberto. Recarregue e tente de novo.")
+
+
+def save_item(ssid: str, tab: str, item: dict, edited: dict, row: int | None):
+    """
+    Grava só os campos alterados. row=None cria o item na próxima linha livre,
+    com todos os campos preenchidos (inclusive id e type).
+    """
+    item_id = str(edited.get("id", "")).strip()
     if not item_id:
         raise ValueError("ID do item não pode ser vazio.")
 
-    for k in item.keys():
-        if k not in out.columns:
-            out[k] = ""
-
-    mask = out["id"].astype(str) == item_id
-    if mask.any():
-        idx = out.index[mask][0]
-        for k, v in item.items():
-            out.at[idx, k] = str(v)
+    if row is None:
+        clear_sheet_caches()
+        index = load_item_index(ssid, tab)
+        if item_id in set(index["id"].astype(str)):
+            raise ValueError(f"ID {item_id} já existe na planilha.")
+        row = next_free_row(index)
+        changes = {k: str(v) for k, v in edited.items() if str(v).strip()}
     else:
-        row = {c: "" for c in out.columns}
-        for k, v in item.items():
-            row[k] = str(v)
-        out = pd.concat([out, pd.DataFrame([row])], ignore_index=True)
+        check_item_row(ssid, tab, row, item_id)
+        changes = {k: str(v) for k, v in edited.items() if str(v) != str(item.get(k, ""))}
+    write_row_cells(ssid, tab, {row: changes})
 
-    return out
 
+def delete_item(ssid: str, tab: str, row: int, item_id: str):
+    check_item_row(ssid, tab, row, item_id)
+    delete_sheet_row(ssid, tab, row)
 
-def delete_item(items: pd.DataFrame, item_id: str) -> pd.DataFrame:
-    if items.empty:
-        return items
-    return items[items["id"].astype(str) != str(item_id)].copy()
+
+TYPE_ID_PREFIX = {"drink": "D", "prato": "P"}
+
+
+def format_id(prefix: str, n: int) -> str:
+    return f"{prefix}{str(n).zfill(3)}"
+
+
+def max_id_number(ids: list[str], prefix: str) -> int:
+    nums: list[int] = []
+    for x in ids:
+        if x.startswith(prefix):
+            tail = x.replace(prefix, "")
+            if tail.isdigit():
+                nums.append(int(tail))
+    return max(nums) if nums else 0
+
+
+def next_id(items: pd.DataFrame, prefix: str) -> str:
+    if items.empty or "id" not in items.columns:
+        return format_id(prefix, 1)
+    ids = items["id"].astype(str).tolist()
+    return format_id(prefix, max_id_number(ids, prefix) + 1)
 
 
 def prettify_label(col: str) -> str:
@@ -505,29 +1071,98 @@ def get_general_cols(all_cols: list[str]) -> tuple[list[str], list[str]]:
     return gens, sorted(extras)
 
 
-def render_text_sections(item: dict, cols: list[str]):
-    any_shown = False
+def _ficha_text(val: str) -> str:
+    # sem quebras de linha literais: uma linha em branco encerraria o bloco HTML no markdown
+    lines = val.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return f"<div class='ficha-text'>{'<br/>'.join(html.escape(x) for x in lines)}</div>"
+
+
+def _ficha_sections(item: dict, cols: list[str], empty_msg: str = "") -> list[str]:
+    parts: list[str] = []
     for c in cols:
         val = str(item.get(c, "")).strip()
         if val:
-            any_shown = True
-            st.markdown(f"### {prettify_label(c)}")
-            st.text(val)
-    if not any_shown:
-        st.info("Sem informações preenchidas neste modo.")
+            parts.append(f"<h3>{html.escape(prettify_label(c))}</h3>")
+            parts.append(_ficha_text(val))
+    if not parts and empty_msg:
+        parts.append(f"<div class='ficha-empty'>{empty_msg}</div>")
+    return parts
+
 
+def item_row_hash(item: dict, all_cols: list[str]) -> str:
+    payload = json.dumps([[c, str(item.get(c, ""))] for c in all_cols], ensure_ascii=False)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def build_ficha_html(row_hash: str, prefix: str, _item: dict, _all_cols: tuple[str, ...]) -> str:
+    """
+    Ficha (meta, concept/strategy, campos do modo e extras) num único bloco HTML.
+    Cache por hash da linha + modo: só é refeita quando a linha do item muda.
+    """
+    all_cols = list(_all_cols)
+    parts: list[str] = []
+
+    meta_parts: list[str] = []
+    for c in ["category", "yield", "total_time_min"]:
+        if c in all_cols:
+            v = str(_item.get(c, "")).strip()
+            if v:
+                meta_parts.append(f"{prettify_label(c)}: {v}")
+    if meta_parts:
+        parts.append(f"<div class='muted'>{html.escape(' | '.join(meta_parts))}</div>")
+
+    parts += _ficha_sections(_item, [c for c in ["concept", "strategy"] if c in all_cols])
+    parts += _ficha_sections(
+        _item,
+        get_mode_cols(all_cols, prefix),
+        empty_msg="Sem informações preenchidas neste modo.",
+    )
+
+    _, extra_general = get_general_cols(all_cols)
+    filled_extras = [
+        c for c in extra_general
+        if c not in ["concept", "strategy"] and str(_item.get(c, "")).strip()
+    ]
+    if filled_extras:
+        parts.append("<hr/><h3>Informações adicionais</h3>")
+        for c in filled_extras:
+            parts.append(f"<strong>{html.escape(prettify_label(c))}</strong>")
+            parts.append(_ficha_text(str(_item.get(c, "")).strip()))
+
+    return f"<div class='ficha'>{''.join(parts)}</div>"
+
+
+def render_ficha(item: dict, all_cols: list[str], modo: str):
+    prefix = "service_" if modo == "Serviço" else "training_"
+    st.markdown(
+        build_ficha_html(item_row_hash(item, all_cols), prefix, item, tuple(all_cols)),
+        unsafe_allow_html=True,
+    )
+
+
+def render_media(item: dict, all_cols: list[str], media_meta: dict[str, dict] | None = None):
+    media_meta = media_meta or {}
 
-def render_media(item: dict, all_cols: list[str]):
     # FOTO
     if "cover_photo_url" in all_cols:
         raw = str(item.get("cover_photo_url", "")).strip()
         if raw:
             fid = extract_drive_file_id(raw)
             if fid:
-                try:
-                    b = drive_download_bytes(fid)
-                    st.image(b, use_container_width=True)
-                except Exception:
+                meta = drive_file_metadata(fid, media_meta)
+                shown = False
+                if drive_media_downloadable(meta):
+                    try:
+                        url = drive_media_static_url(fid, meta)
+                        if url:
+                            render_static_image(url)
+                        else:
+                            st.image(drive_download_bytes(fid), use_container_width=True)
+                        shown = True
+                    except Exception:
+                        pass
+                if not shown:
                     st.image(normalize_drive_direct_view(raw), use_container_width=True)
             else:
                 st.image(raw, use_container_width=True)
@@ -538,10 +1173,19 @@ def render_media(item: dict, all_cols: list[str]):
         if rawv:
             fidv = extract_drive_file_id(rawv)
             if fidv:
-                try:
-                    b = drive_download_bytes(fidv)
-                    st.video(b)
-                except Exception:
+                meta = drive_file_metadata(fidv, media_meta)
+                shown = False
+                if drive_media_downloadable(meta):
+                    try:
+                        url = drive_media_static_url(fidv, meta)
+                        if url:
+                            render_static_video(url)
+                        else:
+                            st.video(drive_download_bytes(fidv))
+                        shown = True
+                    except Exception:
+                        pass
+                if not shown:
                     prev = drive_preview_url(rawv)
                     if prev:
                         components.iframe(prev, height=420)
@@ -554,36 +1198,616 @@ def render_media(item: dict, all_cols: list[str]):
                     st.video(rawv)
 
 
+# ======================================================
+# IMPORTAÇÃO / EXPORTAÇÃO EM LOTE
+# ======================================================
+IMPORT_PREFIX_ALIASES = {
+    "servico_": "service_",
+    "treinamento_": "training_",
+    "treino_": "training_",
+}
+IMPORT_COL_ALIASES = {
+    "nome": "name",
+    "titulo": "name",
+    "tipo": "type",
+    "categoria": "category",
+    "conceito": "concept",
+    "estrategia": "strategy",
+    "rendimento": "yield",
+    "tempo_total_min": "total_time_min",
+    "foto_capa": "cover_photo_url",
+    "video_treinamento": "training_video_url",
+}
+IMPORT_SUFFIX_ALIASES = {
+    "ingredientes": "ingredients",
+    "modo_de_preparo": "steps",
+    "preparo": "steps",
+    "passos": "steps",
+    "etapas": "steps",
+    "copo": "glass",
+    "taca": "glass",
+    "guarnicao": "garnish",
+    "decoracao": "garnish",
+    "montagem": "assembly",
+    "empratamento": "plating",
+    "utensilios": "tools",
+    "equipamentos": "tools",
+    "dicas": "tips",
+    "observacoes": "notes",
+    "notas": "notes",
+}
+IMPORT_TYPE_ALIASES = {"drink": "drink", "drinks": "drink", "prato": "prato", "pratos": "prato"}
+
+
+def _import_key(col: str) -> str:
+    s = unicodedata.normalize("NFKD", str(col)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", s.strip().lower()).strip("_")
+
+
+def _loose_col(col: str) -> str:
+    # "service_ingredient" e "Service Ingredients" batem com service_ingredients
+    return _import_key(col).replace("_", "").rstrip("s")
+
+
+def normalize_import_col(col: str, header: list[str]) -> str:
+    """
+    'Serviço - Ingredientes' -> 'service_ingredients'.
+    Prefixo e sufixo são traduzidos; se o resultado não estiver no cabeçalho da
+    planilha, usa a coluna existente equivalente (plural/espaços), se houver.
+    """
+    s = _import_key(col)
+    for alias, prefix in IMPORT_PREFIX_ALIASES.items():
+        if s.startswith(alias):
+            s = prefix + s[len(alias):]
+            break
+    for prefix in ("service_", "training_"):
+        if s.startswith(prefix):
+            suffix = s[len(prefix):]
+            s = prefix + IMPORT_SUFFIX_ALIASES.get(suffix, suffix)
+    s = IMPORT_COL_ALIASES.get(s, s)
+
+    if s in header:
+        return s
+    loose = {_loose_col(h): h for h in header}
+    return loose.get(_loose_col(s), s)
+
+
+def read_import_file(uploaded, header: list[str]) -> pd.DataFrame:
+    """O índice do resultado é a linha no arquivo (cabeçalho = 1), para as mensagens de erro."""
+    if uploaded.name.lower().endswith(".xlsx"):
+        df = pd.read_excel(uploaded, dtype=str)
+    else:
+        # sep=None detecta "," ou ";" (CSV exportado pelo Excel em pt-BR)
+        df = pd.read_csv(uploaded, dtype=str, sep=None, engine="python")
+
+    df.columns = [normalize_import_col(c, header) for c in df.columns]
+    dup = sorted({c for c in df.columns if list(df.columns).count(c) > 1})
+    if dup:
+        raise ValueError(f"Colunas repetidas após o mapeamento: {', '.join(dup)}")
+
+    df = df.fillna("").astype(str)
+    for c in df.columns:
+        df[c] = df[c].str.strip()
+    df.index = df.index + 2
+    df = df[(df != "").any(axis=1)]
+    for c in BASE_ITEM_COLS:
+        if c not in df.columns:
+            df[c] = ""
+    return df
+
+
+def validate_import(incoming: pd.DataFrame) -> list[str]:
+    errors: list[str] = []
+    seen: set[str] = set()
+    for line, row in incoming.iterrows():
+        if row["type"].lower() not in IMPORT_TYPE_ALIASES:
+            errors.append(f"Linha {line}: tipo inválido '{row['type']}' (use drink ou prato).")
+        if not row["name"]:
+            errors.append(f"Linha {line}: nome vazio.")
+        if row["id"]:
+            if row["id"] in seen:
+                errors.append(f"Linha {line}: ID {row['id']} repetido no arquivo.")
+            seen.add(row["id"])
+    return errors
+
+
+def assign_import_ids(items: pd.DataFrame, incoming: pd.DataFrame) -> pd.DataFrame:
+    """Gera IDs para as linhas sem ID, com um contador por prefixo (sem next_id por linha)."""
+    out = incoming.copy()
+    out["type"] = out["type"].str.lower().map(IMPORT_TYPE_ALIASES)
+
+    ids = items["id"].astype(str).tolist() + out["id"].tolist()
+    counters = {p: max_id_number(ids, p) for p in TYPE_ID_PREFIX.values()}
+    for i in out.index[out["id"] == ""]:
+        prefix = TYPE_ID_PREFIX[out.at[i, "type"]]
+        counters[prefix] += 1
+        out.at[i, "id"] = format_id(prefix, counters[prefix])
+    return out
+
+
+def plan_import(items: pd.DataFrame, header: list[str], incoming: pd.DataFrame) -> dict:
+    """
+    Compara o arquivo com o catálogo atual (dry-run).
+    Colunas novas são as que faltam no cabeçalho real da planilha (numa aba vazia,
+    inclusive id/type/name). Células vazias no arquivo não apagam valores existentes.
+    """
+    new_cols = [c for c in dict.fromkeys(BASE_ITEM_COLS + list(incoming.columns)) if c not in header]
+    pos_by_id = {str(v): pos for pos, v in enumerate(items["id"].astype(str))}
+
+    updates: dict[int, dict[str, str]] = {}
+    appends: list[dict[str, str]] = []
+    report: list[dict[str, str]] = []
+    for _, row in incoming.iterrows():
+        item_id = row["id"]
+        pos = pos_by_id.get(item_id)
+        if pos is None:
+            appends.append(row.to_dict())
+            report.append({"id": item_id, "name": row["name"], "ação": "novo", "campos": ""})
+            continue
+
+        current = items.iloc[pos]
+        changes = {
+            c: v for c, v in row.items()
+            if v and str(current.get(c, "") if c in items.columns else "") != v
+        }
+        if changes:
+            updates[pos] = changes
+            report.append({
+                "id": item_id,
+                "name": row["name"],
+                "ação": "alterar",
+                "campos": ", ".join(changes.keys()),
+            })
+
+    return {
+        "header": list(header),
+        "new_cols": new_cols,
+        "updates": updates,
+        "appends": appends,
+        "append_row": len(items) + 2,
+        "report": pd.DataFrame(report, columns=["id", "name", "ação", "campos"]),
+    }
+
+
+def build_import_plan(items: pd.DataFrame, header: list[str], incoming: pd.DataFrame) -> dict:
+    return plan_import(items, header, assign_import_ids(items, incoming))
+
+
+def import_plan_signature(plan: dict) -> str:
+    """Identifica o que será gravado (células, posições e linhas novas)."""
+    payload = json.dumps(
+        [
+            plan["header"],
+            plan["new_cols"],
+            sorted((pos, sorted(ch.items())) for pos, ch in plan["updates"].items()),
+            plan["appends"],
+            plan["append_row"],
+        ],
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def commit_import(ssid: str, tab: str, plan: dict):
+    """Cabeçalho novo, células alteradas e linhas novas numa única chamada."""
+    cols = plan["header"] + plan["new_cols"]
+    col_idx = {c: i for i, c in enumerate(cols)}
+
+    data: list[tuple[str, list[list[str]]]] = []
+    if plan["new_cols"]:
+        data.append((f"{col_letter(len(plan['header']))}1", [plan["new_cols"]]))
+
+    for pos, changes in plan["updates"].items():
+        for c, v in changes.items():
+            data.append((f"{col_letter(col_idx[c])}{pos + 2}", [[v]]))
+
+    if plan["appends"]:
+        rows = [[str(r.get(c, "")) for c in cols] for r in plan["appends"]]
+        data.append((f"A{plan['append_row']}", rows))
+
+    batch_write_ranges(ssid, tab, data)
+
+
+def export_catalog_order(cols: list[str]) -> list[str]:
+    gens, extras = get_general_cols(cols)
+    ordered = BASE_ITEM_COLS + [c for c in gens if c not in BASE_ITEM_COLS]
+    ordered += get_mode_cols(cols, "service_") + get_mode_cols(cols, "training_") + extras
+    return ordered
+
+
+def export_catalog_bytes(items: pd.DataFrame, fmt: str) -> bytes:
+    df = items[export_catalog_order(list(items.columns))].fillna("").astype(str)
+    if fmt == "xlsx":
+        buf = io.BytesIO()
+        df.to_excel(buf, index=False)
+        return buf.getvalue()
+    # BOM para o Excel abrir acentos corretamente
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+def render_media_report(items: pd.DataFrame, media_meta: dict[str, dict]):
+    broken: list[dict[str, str]] = []
+    for _, row in items.iterrows():
+        for c in MEDIA_URL_COLS:
+            fid = extract_drive_file_id(str(row.get(c, "") or ""))
+            err = media_meta.get(fid, {}).get("error") if fid else None
+            if err:
+                broken.append({"id": str(row["id"]), "name": str(row["name"]), "coluna": c, "erro": err})
+
+    with st.expander(f"Mídias do Drive com problema ({len(broken)})"):
+        if broken:
+            st.dataframe(pd.DataFrame(broken), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Todos os links do Drive estão acessíveis.")
+
+
+def load_full_catalog(ssid: str, tab: str) -> pd.DataFrame:
+    """Todas as colunas de todas as linhas: só para importação/exportação."""
+    return ensure_item_min_schema(read_sheet_with_hyperlinks(ssid, tab))
+
+
+def render_bulk_tools(ssid: str, items_tab: str, index: pd.DataFrame, media_meta: dict[str, dict]):
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.subheader("Administrador · Catálogo")
+
+    with st.expander("Importar fichas (CSV / XLSX)"):
+        st.caption(
+            "Colunas com os mesmos nomes da planilha (ex.: name, type, service_ingredients, training_steps). "
+            "Linhas sem ID recebem um novo. Células vazias não apagam valores existentes."
+        )
+        # trocar a key é o que limpa o file_uploader depois de importar
+        upload_n = st.session_state.get("bulk_import_upload_n", 0)
+        uploaded = st.file_uploader("Arquivo", type=["csv", "xlsx"], key=f"bulk_import_file_{upload_n}")
+        if uploaded is not None:
+            try:
+                incoming = read_import_file(uploaded, read_sheet_header(ssid, items_tab))
+            except Exception as e:
+                st.error(f"Falha ao ler arquivo: {e}")
+                incoming = None
+
+            if incoming is not None:
+                errors = validate_import(incoming)
+                if errors:
+                    for err in errors[:20]:
+                        st.error(err)
+                else:
+                    items = load_full_catalog(ssid, items_tab)
+                    plan = build_import_plan(items, read_sheet_header(ssid, items_tab), incoming)
+                    report = plan["report"]
+
+                    # a prévia que o admin viu é a da execução anterior ao clique em Confirmar
+                    approved_sig = st.session_state.get("bulk_import_sig")
+                    st.session_state["bulk_import_sig"] = import_plan_signature(plan)
+                    if st.session_state.pop("bulk_import_stale", False):
+                        st.error("A planilha mudou desde a prévia. Revise as alterações abaixo e confirme de novo.")
+
+                    c1, c2, c3 = st.columns(3)
+                    c1.metric("Novos", len(plan["appends"]))
+                    c2.metric("Alterados", len(plan["updates"]))
+                    c3.metric("Sem mudança", len(incoming) - len(report))
+                    if plan["new_cols"]:
+                        st.warning(f"Colunas novas na planilha: {', '.join(plan['new_cols'])}")
+                    if not report.empty:
+                        st.dataframe(report, use_container_width=True, hide_index=True)
+
+                        if st.button("Confirmar importação", type="primary", use_container_width=True):
+                            try:
+                                clear_sheet_caches()
+                                fresh = load_full_catalog(ssid, items_tab)
+                                fresh_plan = build_import_plan(fresh, read_sheet_header(ssid, items_tab), incoming)
+                                if import_plan_signature(fresh_plan) != approved_sig:
+                                    st.session_state["bulk_import_stale"] = True
+                                    st.rerun()
+                                commit_import(ssid, items_tab, fresh_plan)
+                                st.session_state["bulk_import_upload_n"] = upload_n + 1
+                                st.session_state.pop("bulk_import_sig", None)
+                                st.success(f"{len(report)} itens importados e sincronizados com a planilha.")
+                                time.sleep(0.4)
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"Falha ao importar: {e}")
+
+    with st.expander("Exportar catálogo"):
+        fmt = st.radio("Formato", ["csv", "xlsx"], horizontal=True, key="bulk_export_fmt")
+        if st.button("Gerar arquivo", use_container_width=True):
+            try:
+                st.download_button(
+                    "Baixar catálogo",
+                    data=export_catalog_bytes(load_full_catalog(ssid, items_tab), fmt),
+                    file_name=f"yvora_catalogo.{fmt}",
+                    use_container_width=True,
+                )
+            except Exception as e:
+                st.error(f"Falha ao exportar: {e}")
+
+    render_media_report(index, media_meta)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+# ======================================================
+# EDIÇÃO EM TABELA
+# ======================================================
+EDITOR_GENERAL_COLS = ["concept", "strategy", "cover_photo_url", "training_video_url"]
+
+
+def grid_editable_cols(all_cols: list[str], admin: bool) -> list[str]:
+    """Mesmas colunas dos formulários: admin edita tudo (menos ID); chefe, conteúdo e mídias."""
+    if admin:
+        return [c for c in export_catalog_order(all_cols) if c != "id"]
+    return (
+        [c for c in EDITOR_GENERAL_COLS if c in all_cols]
+        + get_mode_cols(all_cols, "service_")
+        + get_mode_cols(all_cols, "training_")
+    )
+
+
+def _grid_value(v) -> str:
+    return "" if v is None or pd.isna(v) else str(v)
+
+
+def grid_changes(original: pd.DataFrame, edited: pd.DataFrame, cols: list[str]) -> dict[int, dict[str, str]]:
+    """Só as células alteradas, por número da linha na planilha."""
+    updates: dict[int, dict[str, str]] = {}
+    for i in original.index:
+        changes = {
+            c: _grid_value(edited.at[i, c]) for c in cols
+            if _grid_value(edited.at[i, c]) != _grid_value(original.at[i, c])
+        }
+        if changes:
+            updates[int(original.at[i, "_row"])] = changes
+    return updates
+
+
+def save_grid_changes(ssid: str, tab: str, original: pd.DataFrame, updates: dict[int, dict[str, str]]):
+    # linhas inseridas/removidas desde a leitura deslocariam as células: confere os IDs antes
+    clear_sheet_caches()
+    fresh = load_item_index(ssid, tab)
+    fresh_ids = dict(zip(fresh["_row"], fresh["id"].astype(str)))
+    for row, item_id in zip(original["_row"], original["id"].astype(str)):
+        if row in updates and fresh_ids.get(row) != item_id:
+            raise ValueError("A planilha mudou desde que a tabela foi aberta. Recarregue e refaça as alterações.")
+    write_row_cells(ssid, tab, updates)
+
+
+def render_grid_editor(ssid: str, tab: str, rows: pd.DataFrame, all_cols: list[str], editor_key: str):
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.subheader("Edição em tabela")
+
+    cols = grid_editable_cols(all_cols, is_admin())
+    if rows.empty or not cols:
+        st.info("Nenhum item para editar.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+
+    view_cols = ["id"] + (["name"] if "name" not in cols else [])
+    full = read_sheet_columns(ssid, tab, tuple(view_cols + cols))
+    original = full[full["_row"].isin(rows["_row"])].reset_index(drop=True)
+
+    # o estado do data_editor guarda edições por posição: a chave inclui as linhas exibidas,
+    # senão uma busca com o mesmo número de resultados herdaria as edições de outros itens
+    rows_hash = hashlib.sha1(",".join(map(str, original["_row"])).encode()).hexdigest()[:12]
+    editor_key = f"{editor_key}_{rows_hash}"
+
+    column_config: dict = {c: prettify_label(c) for c in view_cols + cols}
+    if "type" in cols:
+        column_config["type"] = st.column_config.SelectboxColumn(
+            prettify_label("type"),
+            options=list(TYPE_ID_PREFIX.keys()),
+            required=True,
+        )
+
+    edited = st.data_editor(
+        original[view_cols + cols],
+        key=editor_key,
+        num_rows="fixed",
+        hide_index=True,
+        disabled=view_cols,
+        column_config=column_config,
+        use_container_width=True,
+    )
+
+    updates = grid_changes(original, edited, cols)
+    n_cells = sum(len(c) for c in updates.values())
+    st.caption(f"{n_cells} células alteradas em {len(updates)} itens.")
+
+    if st.button("Salvar tabela", type="primary", use_container_width=True, disabled=not updates):
+        try:
+            save_grid_changes(ssid, tab, original, updates)
+            st.session_state.pop(editor_key, None)
+            st.success("Alterações salvas e sincronizadas com a planilha.")
+            time.sleep(0.4)
+            st.rerun()
+        except Exception as e:
+            st.error(f"Falha ao salvar: {e}")
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+# ======================================================
+# WARM-UP / PRONTIDÃO
+# ======================================================
+# Com server.scriptHealthCheckEnabled, o /_stcore/script-health-check roda o script
+# numa sessão sem navegador: é o probe de prontidão do load balancer (200 = pronto).
+WARMUP_MEDIA_ITEMS = 20
+VIEW_COUNTS_PATH = Path(__file__).parent / ".cache" / "views.json"
+
+
+@st.cache_resource
+def view_counter() -> dict:
+    try:
+        counts = json.loads(VIEW_COUNTS_PATH.read_text())
+    except (OSError, ValueError):
+        counts = {}
+    return {"counts": counts, "lock": threading.Lock()}
+
+
+def record_view(location: str, item_id: str):
+    """Conta aberturas por item (persistido em disco) para o warm-up priorizar as mídias mais vistas."""
+    vc = view_counter()
+    key = f"{location}/{item_id}"
+    with vc["lock"]:
+        vc["counts"][key] = vc["counts"].get(key, 0) + 1
+        try:
+            VIEW_COUNTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+            VIEW_COUNTS_PATH.write_text(json.dumps(vc["counts"]))
+        except OSError:
+            pass
+
+
+def warm_up(users_tab: str, items_tab: str) -> list[str]:
+    """
+    Clientes, users, índices das unidades, metadados e mídias dos itens mais vistos.
+    Obrigatórios (levantam exceção): users e pelo menos um índice de unidade.
+    O resto é best-effort; as falhas voltam como avisos.
+    """
+    get_creds()
+    sheets_service()
+    drive_service()
+    load_users_index(users_tab)
+
+    locations = configured_locations()
+    indexes, errors = load_location_indexes(items_tab, list(locations))
+    if not indexes:
+        raise RuntimeError(f"Falha ao carregar unidades: {', '.join(errors)}")
+    warnings = [f"unidade {k}: {e}" for k, e in errors.items()]
+
+    counts = view_counter()["counts"]
+    for key, index in indexes.items():
+        try:
+            load_item_cols(locations[key]["sheet_id"], items_tab)
+            media_meta = drive_media_metadata(collect_media_file_ids(index), _retries=DRIVE_BATCH_RETRIES)
+        except Exception as e:
+            warnings.append(f"mídias de {key}: {e}")
+            continue
+
+        ranked = sorted(
+            range(len(index)),
+            key=lambda i: -counts.get(f"{key}/{index.iloc[i]['id']}", 0),
+        )
+        for i in ranked[:WARMUP_MEDIA_ITEMS]:
+            for c in MEDIA_URL_COLS:
+                fid = extract_drive_file_id(str(index.iloc[i][c]))
+                meta = media_meta.get(fid, {}) if fid else {}
+                if fid and drive_media_downloadable(meta):
+                    try:
+                        drive_media_static_url(fid, meta)
+                    except Exception:
+                        pass
+    return warnings
+
+
+@st.cache_resource
+def warmup_state() -> dict:
+    return {"started": False, "ready": False, "error": "", "lock": threading.Lock()}
+
+
+def _run_warmup(users_tab: str, items_tab: str):
+    state = warmup_state()
+    try:
+        warnings = warm_up(users_tab, items_tab)
+        state["error"] = "; ".join(warnings)
+        state["ready"] = True
+    except Exception as e:
+        state["error"] = str(e)
+        with state["lock"]:
+            state["started"] = False  # o próximo probe tenta de novo
+
+
+def start_warmup(users_tab: str, items_tab: str):
+    """Dispara o warm-up uma vez por processo, em segundo plano."""
+    state = warmup_state()
+    with state["lock"]:
+        if state["started"]:
+            return
+        state["started"] = True
+    threading.Thread(
+        target=_run_warmup,
+        args=(users_tab, items_tab),
+        name=WARMUP_THREAD_NAME,
+        daemon=True,
+    ).start()
+
+
+def is_probe_session() -> bool:
+    # a sessão do health check não tem conexão de navegador, logo não tem headers
+    return not st.context.headers
+
+
+def check_ready():
+    """No probe, uma exceção faz o health check responder 503."""
+    state = warmup_state()
+    if not state["ready"]:
+        raise RuntimeError(f"Warm-up em andamento. {state['error']}".strip())
+
+
 # ======================================================
 # APP
 # ======================================================
 def main():
-    header()
-
     users_tab = st.secrets.get("USERS_TAB", "users")
     items_tab = st.secrets.get("ITEMS_TAB", "items")
 
-    try:
-        users = read_sheet_values(users_tab)
-    except Exception as e:
-        st.error(f"Erro lendo aba users: {e}")
+    start_warmup(users_tab, items_tab)
+    if is_probe_session():
+        check_ready()
         return
 
+    if "auth" in st.session_state and not check_session(users_tab):
+        logout()
+
+    header()
+
     if "auth" not in st.session_state:
         try:
-            login(users)
+            users_index = load_users_index(users_tab)
         except Exception as e:
-            st.error(str(e))
+            st.error(f"Erro lendo aba users: {e}")
+            return
+        login(users_index)
+        return
+
+    auth = st.session_state["auth"]
+
+    locations = configured_locations()
+    loc_keys = user_locations(auth)
+    if not loc_keys:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.error("Este usuário não tem acesso a nenhuma unidade. Ajuste a coluna locations na aba users.")
+        st.markdown("</div>", unsafe_allow_html=True)
         return
 
+    if st.session_state.get("location") not in loc_keys:
+        st.session_state["location"] = loc_keys[0]
+    if len(loc_keys) > 1:
+        st.radio(
+            "Unidade",
+            loc_keys,
+            key="location",
+            format_func=lambda k: locations[k]["name"],
+            horizontal=True,
+            on_change=reset_item_selection,
+        )
+    location = st.session_state["location"]
+    ssid = locations[location]["sheet_id"]
+
+    indexes, load_errors = load_location_indexes(items_tab, loc_keys)
+    if location not in indexes:
+        st.error(f"Erro lendo aba items: {load_errors.get(location, '')}")
+        return
+    index = indexes[location]
+
     try:
-        items = read_sheet_with_hyperlinks(items_tab)
-        items = ensure_item_min_schema(items)
+        all_cols = load_item_cols(ssid, items_tab)
     except Exception as e:
         st.error(f"Erro lendo aba items: {e}")
         return
 
-    auth = st.session_state["auth"]
+    try:
+        media_meta = drive_media_metadata(collect_media_file_ids(index))
+    except Exception:
+        media_meta = {}
 
     allowed_modules: list[str] = []
     if auth.get("role") == "admin":
@@ -607,11 +1831,13 @@ def main():
         modo = st.radio("Modo", ["Serviço", "Treinamento"])
     with colC:
         busca = st.text_input("Buscar", placeholder="nome / tag")
+        search_all = len(loc_keys) > 1 and st.checkbox("Buscar em todas as unidades", key="search_all_locations")
+        grid_mode = can_edit() and st.toggle("Editar em tabela", key="grid_mode")
     with colD:
         if is_admin():
             if st.button("Novo", type="primary", use_container_width=True):
-                prefix = "D" if tipo == "Drinks" else "P"
-                new_id = next_id(items, prefix)
+                prefix = TYPE_ID_PREFIX["drink" if tipo == "Drinks" else "prato"]
+                new_id = next_id(index, prefix)
                 st.session_state["item"] = new_id
                 st.session_state["creating_new"] = True
                 st.rerun()
@@ -621,13 +1847,20 @@ def main():
         st.error("Sem permissão para acessar este módulo.")
         return
 
-    df = items[items["type"].astype(str).str.lower() == tipo_val].copy()
+    cross_search = bool(busca and search_all)
+    if cross_search:
+        df = pd.concat(
+            [indexes[k].assign(_location=k) for k in loc_keys if k in indexes],
+            ignore_index=True,
+        )
+        if load_errors:
+            failed = ", ".join(locations[k]["name"] for k in load_errors)
+            st.warning(f"Não foi possível buscar em: {failed}")
+    else:
+        df = index.assign(_location=location)
 
-    if busca and not df.empty:
-        b = busca.strip().lower()
-        name_ok = df["name"].astype(str).str.lower().str.contains(b) if "name" in df.columns else False
-        tags_ok = df["tags"].astype(str).str.lower().str.contains(b) if "tags" in df.columns else False
-        df = df[name_ok | tags_ok]
+    df = df[df["type"].astype(str).str.lower() == tipo_val].copy()
+    df = search_index(df, busca)
 
     st.markdown("<div class='card'>", unsafe_allow_html=True)
     st.subheader("Itens")
@@ -636,20 +1869,32 @@ def main():
     else:
         show = df.sort_values("name" if "name" in df.columns else "id")
         for _, row in show.iterrows():
-            label = str(row.get("name", row.get("id", ""))).strip() or str(row.get("id", ""))
-            if st.button(label, use_container_width=True, key=f"btn_{row.get('id','')}"):
-                st.session_state["item"] = str(row.get("id", ""))
-                st.session_state.pop("creating_new", None)
-                st.session_state.pop("confirm_delete", None)
-                st.rerun()
+            row_id = str(row.get("id", ""))
+            label = str(row.get("name", row_id)).strip() or row_id
+            if cross_search:
+                label = f"{label} · {locations[row['_location']]['name']}"
+            st.button(
+                label,
+                use_container_width=True,
+                key=f"btn_{row['_location']}_{row_id}",
+                on_click=open_item,
+                args=(row["_location"], row_id),
+            )
     st.markdown("</div>", unsafe_allow_html=True)
 
+    if grid_mode:
+        grid_rows = df[df["_location"] == location]
+        render_grid_editor(ssid, items_tab, grid_rows, all_cols, f"grid_{location}_{tipo_val}")
+
+    if is_admin():
+        render_bulk_tools(ssid, items_tab, index, media_meta)
+
     if "item" not in st.session_state:
         return
 
     item_id = str(st.session_state["item"])
     creating_new = bool(st.session_state.get("creating_new", False))
-    all_cols = list(items.columns)
+    item_row: int | None = None
 
     if creating_new:
         if not is_admin():
@@ -660,11 +1905,15 @@ def main():
         item["type"] = tipo_val
         item["name"] = ""
     else:
-        match = items[items["id"].astype(str) == item_id]
-        if match.empty:
+        try:
+            found = read_item(ssid, items_tab, index, item_id)
+        except Exception as e:
+            st.error(f"Erro lendo item: {e}")
+            return
+        if found is None:
             st.warning("Item não encontrado na base.")
             return
-        item = match.iloc[0].to_dict()
+        item, item_row = found
         if str(item.get("type", "")).lower().strip() != tipo_val:
             st.session_state.pop("item", None)
             st.warning("O item selecionado não pertence ao módulo atual.")
@@ -673,45 +1922,9 @@ def main():
     st.markdown("<div class='card'>", unsafe_allow_html=True)
     st.subheader("Novo item" if creating_new else str(item.get("name", "")))
 
-    render_media(item, all_cols)
+    render_media(item, all_cols, media_meta)
 
-    meta_parts: list[str] = []
-    for c in ["category", "yield", "total_time_min"]:
-        if c in all_cols:
-            v = str(item.get(c, "")).strip()
-            if v:
-                meta_parts.append(f"{prettify_label(c)}: {v}")
-    if meta_parts:
-        st.markdown(f"<div class='muted'>{' | '.join(meta_parts)}</div>", unsafe_allow_html=True)
-
-    for c in ["concept", "strategy"]:
-        if c in all_cols:
-            v = str(item.get(c, "")).strip()
-            if v:
-                st.markdown(f"### {prettify_label(c)}")
-                st.text(v)
-
-    if modo == "Serviço":
-        mode_cols = get_mode_cols(all_cols, "service_")
-        render_text_sections(item, mode_cols)
-    else:
-        mode_cols = get_mode_cols(all_cols, "training_")
-        render_text_sections(item, mode_cols)
-
-    _, extra_general = get_general_cols(all_cols)
-    filled_extras = []
-    for c in extra_general:
-        if c in ["concept", "strategy"]:
-            continue
-        v = str(item.get(c, "")).strip()
-        if v:
-            filled_extras.append(c)
-    if filled_extras:
-        st.markdown("<hr/>", unsafe_allow_html=True)
-        st.markdown("### Informações adicionais")
-        for c in filled_extras:
-            st.markdown(f"**{prettify_label(c)}**")
-            st.text(str(item.get(c, "")).strip())
+    render_ficha(item, all_cols, modo)
 
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -769,8 +1982,7 @@ def main():
         with colS:
             if st.button("Salvar (Admin)", type="primary", use_container_width=True):
                 try:
-                    items2 = upsert_item(items, edited)
-                    write_sheet(items_tab, items2)
+                    save_item(ssid, items_tab, item, edited, item_row)
                     st.session_state["creating_new"] = False
                     st.success("Salvo e sincronizado com a planilha.")
                     time.sleep(0.4)
@@ -789,8 +2001,7 @@ def main():
             with c1:
                 if st.button("Confirmar exclusão", type="primary", use_container_width=True):
                     try:
-                        items2 = delete_item(items, item_id)
-                        write_sheet(items_tab, items2)
+                        delete_item(ssid, items_tab, item_row, item_id)
                         st.session_state.pop("confirm_delete", None)
                         st.session_state.pop("item", None)
                         st.success("Item excluído e sincronizado com a planilha.")
@@ -835,8 +2046,7 @@ def main():
 
         if st.button("Salvar alterações", type="primary", use_container_width=True):
             try:
-                items2 = upsert_item(items, edited)
-                write_sheet(items_tab, items2)
+                save_item(ssid, items_tab, item, edited, item_row)
                 st.success("Alterações salvas e sincronizadas com a planilha.")
                 time.sleep(0.4)
                 st.rerun()